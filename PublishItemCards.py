@@ -5,26 +5,46 @@
 # publishing to meet your exact needs and working environments.
 
 # ### Import python libraries
-import copy
+import functools
 # used to prompt for user input
 # when using this script internally, you may remove this and simply hard code in your username and password
 import getpass
 import json
+import logging
 import os
+import queue
 import re
 import sys
+import threading
 import time
-import traceback
-import urllib
-import urllib.request as request
-import urllib.request as urlopen
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from tenacity import Retrying, retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+# orjson is optional, it parses the large Goal List a few times faster than the json module
+try:
+    import orjson
+except ImportError:
+    orjson = None
 # this helps us do some debugging within the Python Notebook
 # another optional component
 from IPython.display import display
 from arcgis.gis import GIS
 
+# ### Set up logging
+# Progress is logged through a queue so the publishing threads don't wait on each other writing to stdout.
+# Change the level to logging.WARNING to only see errors.
+log = logging.getLogger("sdg_publisher")
+log.setLevel(logging.INFO)
+log.propagate = False
+log_queue = queue.Queue()
+log.addHandler(QueueHandler(log_queue))
+log_listener = QueueListener(log_queue, logging.StreamHandler(sys.stdout))
+log_listener.start()
+
 # ### Create a connection to your ArcGIS Online Organization
 # This will rely on using the ArcGIS API for python to connect to your ArcGIS Online Organization to publish and
 # manage data.  For more information about this python library visit the developer
@@ -44,6 +64,44 @@ open_data_group_id = '15c1671f5fbc4a00b1a359d51ea6a546'
 open_data_group = gis_online_connection.groups.get(open_data_group_id)
 failed_series = []
 
+# max_publish_workers:  Number of series published at the same time, keep this low enough to stay under the
+# ArcGIS Online rate limits.  series_lock guards online_items between the workers
+max_publish_workers = 8
+series_lock = threading.Lock()
+
+# field_aliases:  Display names for the fields of the published CSV files, any other field is capitalized
+field_aliases = {
+    "series_release": "Series Release",
+    "series_code": "Series Code",
+    "series_description": "Series Description",
+    "geoAreaCode": "Geographic Area Code",
+    "geoAreaName": "Geographic Area Name",
+    "Freq": "Frequency",
+    "latest_year": "Latest Year",
+    "latest_value": "Latest Value",
+    "latest_source": "Latest Source",
+    "latest_nature": "Latest Nature",
+    "last_5_years_mean": "Mean of the Last 5 Years",
+    "ISO3CD": "ISO3 Code"
+}
+
+# ### Create a shared HTTP session
+# All calls to the SDG and ArcGIS REST APIs go through one session so the connections (and TLS handshakes) are
+# pooled and reused across the many per-series requests.  Transient server errors are retried with a short backoff,
+# for POST as well since the only POST is the read only analyze request.
+http_session = requests.Session()
+http_session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=32,
+                                           max_retries=Retry(total=5, backoff_factor=0.3,
+                                                             status_forcelist=[429, 500, 502, 503, 504],
+                                                             allowed_methods=None)))
+
+# retry_on_connection_error:  Retry a single ArcGIS API for Python call when the connection drops or times out, with
+# an exponential backoff.  These calls use the SDK's own connection rather than the session above, so HTTP errors
+# such as 429 and 502 are not retried for them
+retry_on_connection_error = retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1, max=30),
+                                  retry=retry_if_exception_type((requests.ConnectionError, requests.Timeout)),
+                                  reraise=True)
+
 # ### Get the JSON Data from the UN SDG Metadata API
 # The SDG Metadata API is designed to  retrieve information and metadata on the
 # [Sustainable Development Goals](http://www.un.org/sustainabledevelopment/sustainable-development-goals/).
@@ -53,10 +111,86 @@ failed_series = []
 # [github](https://github.com/UNStats-SDGs/sdg-metadata-api)
 
 url = "https://unstats.un.org/SDGAPI/v1/sdg/Goal/List?includechildren=true"
-req = request.Request(url)
-response = urlopen.urlopen(req)
-response_bytes = response.read()
-json_data = json.loads(response_bytes.decode("UTF-8"))
+
+# cache_dir:  The Goal List and the Metadata API rarely change, keep a copy on disk between runs
+cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "sdg-publisher")
+
+
+# ### Fetch JSON with an on-disk cache
+# The cached copy is only re-downloaded when the server reports a change (ETag / Last-Modified), otherwise the
+# copy saved by a previous run is used.  A new response is streamed in chunks into the cache file and then parsed
+# from the file.  If the cache can't be written the response is parsed directly.
+def parse_json(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# Without orjson the file is read as text by json.load, so there is no bytes copy held next to the decoded text
+def parse_json_file(file_name):
+    if orjson is not None:
+        with open(file_name, "rb") as f:
+            return orjson.loads(f.read())
+    with open(file_name, encoding="UTF-8") as f:
+        return json.load(f)
+
+
+def get_cached_json(json_url, cache_name):
+    cache_file = os.path.join(cache_dir, cache_name + ".json")
+    headers_file = os.path.join(cache_dir, cache_name + ".headers.json")
+    has_cache = os.path.isfile(cache_file)
+
+    headers = dict()
+    if has_cache and os.path.isfile(headers_file):
+        try:
+            with open(headers_file, encoding="UTF-8") as f:
+                cached_headers = json.load(f)
+            if cached_headers.get("etag"):
+                headers["If-None-Match"] = cached_headers["etag"]
+            if cached_headers.get("last_modified"):
+                headers["If-Modified-Since"] = cached_headers["last_modified"]
+        except (OSError, ValueError):
+            # Without the headers the copy is simply downloaded again
+            pass
+
+    try:
+        with http_session.get(json_url, headers=headers, timeout=30, stream=True) as response:
+            if response.status_code != 304 or not has_cache:
+                response.raise_for_status()
+                download_file = cache_file + ".download"
+                try:
+                    os.makedirs(cache_dir, exist_ok=True)
+                    download = open(download_file, "wb")
+                except OSError:
+                    log.warning("Unable to write to the cache in %s", cache_dir, exc_info=True)
+                    return parse_json(response.content)
+
+                cache_updated = False
+                try:
+                    with download:
+                        for chunk in response.iter_content(chunk_size=64 * 1024):
+                            download.write(chunk)
+                    os.replace(download_file, cache_file)
+                    cache_updated = True
+                    with open(headers_file, "w", encoding="UTF-8") as f:
+                        json.dump({"etag": response.headers.get("ETag"),
+                                   "last_modified": response.headers.get("Last-Modified")}, f)
+                except OSError:
+                    log.warning("Unable to write to the cache in %s", cache_dir, exc_info=True)
+                    # The response has already been read (eg. the disk filled up), download it again without caching
+                    if not cache_updated:
+                        return parse_json(http_session.get(json_url, timeout=30).content)
+    except requests.RequestException:
+        # Fall back to the copy from the last run if the API can not be reached
+        if not has_cache:
+            raise
+
+    return parse_json_file(cache_file)
+
+
+@functools.lru_cache(maxsize=1)
+def get_goal_list():
+    return get_cached_json(url, "goal_list")
 
 
 # Make sure the data is assigned to the admin user
@@ -68,7 +202,7 @@ def reassign_to_admin():
 
     user_items = user.items(folder='Open Data', max_items=800)
     for item in user_items:
-        print('reassigning item ' + item.title + ' to admin user')
+        log.info("Reassigning item %s to admin user", item.title)
         item.reassign_to(admin_user.username, 'Open Data')
 
 
@@ -76,24 +210,27 @@ def cleanup_site():
     user = gis_online_connection.users.get(online_username)
     user_items = user.items(folder='Open Data', max_items=800)
     for item in user_items:
-        print('deleting item ' + item.title)
+        log.info("Deleting item %s", item.title)
         item.delete()
 
     return
 
 
+# Index the series tags in the Metadata API by (goal, target, indicator, series) so each lookup is a single dict get
+@functools.lru_cache(maxsize=1)
+def get_series_tag_index():
+    return {(goal["goal"], target["target"], indicator["indicator"], series["series"]): series["tags"]
+            for goal in get_metadata()
+            for target in goal.get("targets", [])
+            for indicator in target.get("indicators", [])
+            for series in indicator.get("series", [])}
+
+
 def get_series_tags(goal_metadata=None, indicator_code=None, target_code=None, series_code=None):
     try:
-        for target in goal_metadata["targets"]:
-            if target["target"] == target_code:
-                for indicator in target["indicators"]:
-                    if indicator["indicator"] == indicator_code:
-                        for series in indicator["series"]:
-                            if series["series"] == series_code:
-                                return series["tags"]
-        return []
-    except:
-        traceback.print_exc()
+        return get_series_tag_index().get((goal_metadata["goal"], target_code, indicator_code, series_code), [])
+    except Exception:
+        log.exception("Unable to find the tags for series %s", series_code)
         return []
 
 
@@ -122,18 +259,29 @@ def get_series_tags(goal_metadata=None, indicator_code=None, target_code=None, s
 def process_sdg_information(goal_code=None, indicator_code=None, target_code=None, series_code=None,
                             property_update_only=False):
     try:
-        sdg_metadata = get_metadata()
-        for goal in json_data:
-            # Determine if we are processing this query Only process a specific series code
-            if goal_code is not None and int(goal["code"]) != goal_code:
-                continue
-
+        series_jobs = []
+        # Collect the new open data group tags and update the group once at the end
+        new_tags = set(open_data_group["tags"])
+        # Fetch the SDG metadata, the Goal List and the items already published (before the workers start looking
+        # them up) at the same time, none of these depend on each other
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            metadata_future = executor.submit(get_metadata)
+            goals_future = executor.submit(get_goal_list)
+            executor.submit(load_online_items).result()
+        sdg_metadata = metadata_future.result()
+        if sdg_metadata is None:
+            log.error("Unable to load the SDG metadata")
+            return
+        sdg_by_goal = {int(goal_item["goal"]): goal_item for goal_item in sdg_metadata}
+
+        # Determine if we are processing this query Only process a specific goal code
+        goals = goals_future.result()
+        if goal_code is not None:
+            goals = [goal for goal in goals if int(goal["code"]) == int(goal_code)]
+
+        for goal in goals:
             # Get the Thumbnail from the SDG API
-            for goal_item in sdg_metadata:
-                if goal_item["goal"] == int(goal["code"]):
-                    goal_metadata = goal_item
-                    break
-
+            goal_metadata = sdg_by_goal.get(int(goal["code"]))
             if goal_metadata is None:
                 continue
 
@@ -154,12 +302,12 @@ def process_sdg_information(goal_code=None, indicator_code=None, target_code=Non
             # Iterate through each of the targets
             for target in goal["targets"]:
                 # Determine if we are processing this query Only process a specific target code
-                if target_code is not None and int(target["code"]) != target_code:
+                if target_code is not None and target["code"] != str(target_code):
                     continue
 
                 group_target_properties = dict()
                 group_target_properties["tags"] = ["Target " + target["code"]]
-                open_data_group.update(tags=open_data_group["tags"] + group_target_properties["tags"])
+                new_tags.update(group_target_properties["tags"])
 
                 # Iterate through each of the indicators
                 for indicator in target["indicators"]:
@@ -172,19 +320,21 @@ def process_sdg_information(goal_code=None, indicator_code=None, target_code=Non
                     process_indicator["tags"] = [process_indicator["name"]]
 
                     # Append the keyword tags from the metadata as well
-                    open_data_group.update(tags=open_data_group["tags"] + process_indicator["tags"])
+                    new_tags.update(process_indicator["tags"])
 
                     process_indicator["snippet"] = indicator["code"] + ": " + indicator["description"]
-                    process_indicator["description"] = "<p><strong>Indicator " + indicator["code"] + ": </strong>" + \
-                                                       indicator[
-                                                           "description"] + "</p>" + "</p><p><strong>Target " + target[
-                                                           "code"] + ": </strong>" + target[
-                                                           "description"] + "</p>" + "<p>" + goal[
-                                                           "description"] + "</p>"
+                    process_indicator["description"] = \
+                        f'<p><strong>Indicator {indicator["code"]}: </strong>{indicator["description"]}</p>' \
+                        f'<p><strong>Target {target["code"]}: </strong>{target["description"]}</p>' \
+                        f'<p>{goal["description"]}</p>'
 
                     process_indicator["credits"] = "UNSD"
                     process_indicator["thumbnail"] = thumbnail
 
+                    # The goal, target and indicator tags are the same for every series of this indicator
+                    base_tags = group_goal_properties["tags"] + group_target_properties["tags"] + \
+                                process_indicator["tags"]
+
                     # Iterate through each of the series
                     for series in indicator["series"]:
                         # Determine if we are processing this query Only process a specific series code
@@ -198,79 +348,69 @@ def process_sdg_information(goal_code=None, indicator_code=None, target_code=Non
                         if not series["description"]:
                             series["description"] = series["code"]
                         snippet = series["code"] + ": " + series["description"]
-                        item_properties["snippet"] = (snippet[:250] + "..") if len(snippet) > 250 else snippet
-                        item_properties["description"] = "<p><strong>Series " + series["code"] + ": </strong>" + series[
-                            "description"] + "</p>" + process_indicator["description"] + \
-                                                         "<p><strong>Release Version</strong>: " + series["release"]
-                        final_tags = group_goal_properties["tags"] + group_target_properties["tags"] + \
-                                     process_indicator["tags"]
-                        final_tags.extend(get_series_tags(goal_metadata=goal_metadata, indicator_code=indicator["code"],
-                                                          target_code=target["code"], series_code=series["code"]))
-                        # Append the version number to the tags
-                        final_tags.append(series["release"])
-                        item_properties["tags"] = final_tags
-
-                        # Add this item to ArcGIS Online
-                        print("Processing series code:", indicator["code"], series["code"])
-                        try:
-                            if property_update_only:
-                                online_item = find_online_item(item_properties["title"])
-                                if online_item is None:
-                                    failed_series.append(series["code"])
-                                else:
-                                    # Update the Item Properties from the item_properties
-                                    online_item.update(item_properties=item_properties, thumbnail=thumbnail)
-                            else:
-                                online_item = publish_csv(indicator, series, item_properties=item_properties,
-                                                          thumbnail=thumbnail,
-                                                          property_update_only=property_update_only)
-
-                            if online_item is not None:
-                                display(online_item)
-                                # Share this content with the open data group
-                                online_item.share(everyone=True, org=True, groups=open_data_group["id"],
-                                                  allow_members_to_edit=False)
-                                # Update the Group Information with Data from the Indicator and targets
-                                open_data_group.update(tags=open_data_group["tags"] + [series["code"]])
-                            else:
-                                failed_series.append(series["code"])
-                        except:
-                            traceback.print_exc()
-                            print("Failed to process series code:", indicator["code"], series["code"])
-                            failed_series.append(series["code"])
-                            return
-
-    except:
-        traceback.print_exc()
+                        item_properties["snippet"] = snippet if len(snippet) <= 250 else f"{snippet[:248]}.."
+                        item_properties["description"] = \
+                            f'<p><strong>Series {series["code"]}: </strong>{series["description"]}</p>' \
+                            f'{process_indicator["description"]}' \
+                            f'<p><strong>Release Version</strong>: {series["release"]}'
+                        # Append the series keyword tags and the version number to the tags
+                        item_properties["tags"] = base_tags + \
+                            get_series_tags(goal_metadata=goal_metadata, indicator_code=indicator["code"],
+                                            target_code=target["code"], series_code=series["code"]) + \
+                            [series["release"]]
+
+                        series_jobs.append((indicator, series, item_properties, thumbnail))
+
+        # Publish the series in parallel, each series is a handful of blocking calls to ArcGIS Online.
+        # Read the token once here rather than in every worker
+        token = gis_online_connection.con.token
+        with ThreadPoolExecutor(max_workers=max_publish_workers) as executor:
+            for published_code, online_item in executor.map(
+                    lambda job: process_one_series(*job, property_update_only=property_update_only, token=token),
+                    series_jobs):
+                if online_item is not None:
+                    new_tags.add(published_code)
+                else:
+                    failed_series.append(published_code)
+
+        # Update the Group Information with Data from the Indicator and targets
+        open_data_group.update(tags=sorted(new_tags))
+
+    except Exception:
+        log.exception("Failed to process the SDG information")
+
+
+# ### process_one_series
+# Add or update a single series in ArcGIS Online and share it with the open data group.  This is run from a pool of
+# worker threads so it returns the series code and the online item (or None on failure) rather than touching the
+# shared failed_series list and open data group itself.
+def process_one_series(indicator, series, item_properties, thumbnail, property_update_only=False, token=None):
+    log.info("Processing series code: %s %s", indicator["code"], series["code"])
+    try:
+        if property_update_only:
+            online_item = find_online_item(item_properties["title"])
+            if online_item is not None:
+                # Update the Item Properties from the item_properties
+                online_item.update(item_properties=item_properties, thumbnail=thumbnail)
+        else:
+            online_item = publish_csv(indicator, series, item_properties=item_properties,
+                                      thumbnail=thumbnail,
+                                      property_update_only=property_update_only, token=token)
+
+        if online_item is not None:
+            display(online_item)
+            # Share this content with the open data group
+            online_item.share(everyone=True, org=True, groups=open_data_group["id"],
+                              allow_members_to_edit=False)
+
+        return series["code"], online_item
+    except Exception:
+        log.exception("Failed to process series code: %s %s", indicator["code"], series["code"])
+        return series["code"], None
 
 
 def set_field_alias(field_name):
-    if field_name == "series_release":
-        return "Series Release"
-    if field_name == "series_code":
-        return "Series Code"
-    if field_name == "series_description":
-        return "Series Description"
-    if field_name == "geoAreaCode":
-        return "Geographic Area Code"
-    if field_name == "geoAreaName":
-        return "Geographic Area Name"
-    if field_name == "Freq":
-        return "Frequency"
-    if field_name == "latest_year":
-        return "Latest Year"
-    if field_name == "latest_value":
-        return "Latest Value"
-    if field_name == "latest_source":
-        return "Latest Source"
-    if field_name == "latest_nature":
-        return "Latest Nature"
-    if field_name == "last_5_years_mean":
-        return "Mean of the Last 5 Years"
-    if field_name == "ISO3CD":
-        return "ISO3 Code"
-    else:
-        return field_name.capitalize().replace("_", " ")
+    return field_aliases.get(field_name) or field_name.capitalize().replace("_", " ")
 
 
 # ### Analyze the CSV file
@@ -280,14 +420,26 @@ def set_field_alias(field_name):
 # More info about the analyze endpoint can be found
 # [here](https://developers.arcgis.com/rest/users-groups-and-items/analyze.htm).
 
-def analyze_csv(item_id):
+analyze_url = gis_online_connection.content.gis.url + "/sharing/rest/content/features/analyze"
+
+
+# token:  The token for the connection, read once by the caller.  If None, or if it has expired (error 498/499), the
+# token is read from the connection
+def analyze_csv(item_id, token=None):
     try:
-        sharing_url = gis_online_connection.content.gis.url + "/sharing/rest/content/features/analyze"
-        analyze_params = {'f': 'json', 'token': gis_online_connection.con.token,
+        if token is None:
+            token = gis_online_connection.con.token
+        analyze_params = {'f': 'json', 'token': token,
                           'sourceLocale': 'en-us',
                           'filetype': 'csv', 'itemid': item_id}
-        r = requests.post(sharing_url, data=analyze_params)
-        analyze_json_data = json.loads(r.content.decode("UTF-8"))
+        analyze_json_data = http_session.post(analyze_url, data=analyze_params, timeout=60).json()
+        # The token passed in can expire during a long run, reading it from the connection again refreshes it
+        if analyze_json_data.get("error", {}).get("code") in (498, 499):
+            analyze_params["token"] = gis_online_connection.con.token
+            analyze_json_data = http_session.post(analyze_url, data=analyze_params, timeout=60).json()
+        if "error" in analyze_json_data:
+            log.error("Unable to analyze item %s: %s", item_id, analyze_json_data["error"].get("message"))
+            return None
         for field in analyze_json_data["publishParameters"]["layerInfo"]["fields"]:
             field["alias"] = set_field_alias(field["name"])
 
@@ -299,27 +451,81 @@ def analyze_csv(item_id):
         # set up some of the layer information for display
         analyze_json_data["publishParameters"]["layerInfo"]["displayField"] = "geoAreaName"
         return analyze_json_data["publishParameters"]
-    except:
-        print("Unexpected error:", sys.exc_info()[0])
+    except Exception:
+        log.exception("Unexpected error")
         return None
 
 
+# ### Calls to ArcGIS Online
+# The content calls made for every series are retried on their own when the connection drops, rather than retrying
+# the whole publishing step around them.
+@retry_on_connection_error
+def search_content(query_string, max_items=10):
+    return gis_online_connection.content.search(query_string, max_items=max_items)
+
+
+# Adding an item is not safe to repeat: the item may already have been created when the connection drops.  It is
+# not retried on a timeout (large uploads usually time out after the item was created), and before a retry the item
+# is searched for by title and returned if it exists.
+def add_content(item_properties, thumbnail, data, folder):
+    title = item_properties["title"]
+    for attempt in Retrying(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1, max=30),
+                            retry=retry_if_exception_type(requests.ConnectionError), reraise=True):
+        with attempt:
+            if attempt.retry_state.attempt_number > 1:
+                query_string = "title:'{}' AND owner:{}".format(title, online_username)
+                for search_result in search_content(query_string):
+                    if search_result["title"] == title:
+                        return search_result
+            return gis_online_connection.content.add(item_properties=item_properties, thumbnail=thumbnail,
+                                                     data=data, folder=folder)
+
+
+@retry_on_connection_error
+def publish_item(item, publish_parameters):
+    return item.publish(publish_parameters=publish_parameters, overwrite=True)
+
+
 # ### Find the Online Item
-def find_online_item(title):
+# Items already in the Open Data folder, and every CSV file owned by the user in any folder, are loaded once by
+# load_online_items so most lookups don't need a search.  Items found by a search are added to the same cache.
+online_items = dict()
+
+
+def load_online_items():
+    user = gis_online_connection.users.get(online_username)
+    csv_items = search_content("owner:{} type:CSV".format(online_username), max_items=10000)
+    with series_lock:
+        online_items.clear()
+        for item in user.items(folder='Open Data', max_items=1000):
+            online_items[item.title] = item
+        for item in csv_items:
+            online_items[item.title] = item
+
+
+# search_on_miss:  Set to False when the item would already have been loaded by load_online_items (eg. CSV files)
+def find_online_item(title, search_on_miss=True):
     try:
+        with series_lock:
+            online_item = online_items.get(title)
+        if online_item is not None or not search_on_miss:
+            return online_item
+
         # Search for this ArcGIS Online Item
         query_string = "title:'{}' AND owner:{}".format(title, online_username)
-        print('Searching for ' + title)
-        search_results = gis_online_connection.content.search(query_string)
+        log.info("Searching for %s", title)
+        search_results = search_content(query_string)
 
         if search_results:
             for search_result in search_results:
                 if search_result["title"] == title:
+                    with series_lock:
+                        online_items[title] = search_result
                     return search_result
 
         return None
-    except:
-        print("Unexpected error:", sys.exc_info()[0])
+    except Exception:
+        log.exception("Unexpected error")
         return None
 
 
@@ -329,7 +535,7 @@ def find_online_item(title):
 # - Check if the CSV file exists
 # - If exists, update and move to Open Data Folder under the owner content
 # - If it doesn't exist, publish as a new Item then move to the Open Data Group
-def publish_csv(indicator, series, item_properties, thumbnail, property_update_only=False):
+def publish_csv(indicator, series, item_properties, thumbnail, property_update_only=False, token=None):
     # Do we need to publish the hosted feature service for this layer
     try:
         data_dir = r"FIS4SDGs/csv/"
@@ -337,32 +543,29 @@ def publish_csv(indicator, series, item_properties, thumbnail, property_update_o
 
         file = os.path.join(data_dir, series["code"] + "_cube.pivot.csv")
         if os.path.isfile(file):
-            csv_item_properties = copy.deepcopy(item_properties)
-            csv_item_properties["title"] = series_title
-            csv_item_properties["type"] = "CSV"
-            csv_item_properties["url"] = ""
+            csv_item_properties = {**item_properties, "title": series_title, "type": "CSV", "url": ""}
 
-            # Does this CSV already exist
-            csv_item = find_online_item(csv_item_properties["title"])
+            # Does this CSV already exist, all the CSV files were loaded up front so there is no need to search
+            csv_item = find_online_item(csv_item_properties["title"], search_on_miss=False)
             if csv_item is None:
-                print('Adding CSV File to ArcGIS Online....')
-                csv_item = gis_online_connection.content.add(item_properties=csv_item_properties, thumbnail=thumbnail,
-                                                             data=file)
+                # Add the CSV straight into the Open Data Folder, this saves moving it before publishing
+                log.info("Adding CSV file %s to ArcGIS Online", series_title)
+                csv_item = add_content(item_properties=csv_item_properties, thumbnail=thumbnail, data=file,
+                                       folder="Open Data")
                 if csv_item is None:
                     return None
 
                 # publish the layer if it was not found
-                print('Analyze Feature Service....')
-                publish_parameters = analyze_csv(csv_item["id"])
+                log.info("Analyzing feature service %s", series_title)
+                publish_parameters = analyze_csv(csv_item["id"], token)
                 if publish_parameters is None:
-                    failed_series.append(series["code"])
                     return None
                 else:
                     publish_parameters["name"] = csv_item_properties["title"]
-                    publishParameters["layerInfo"]["name"] = csv_item_properties["snippet"]
+                    publish_parameters["layerInfo"]["name"] = csv_item_properties["snippet"]
 
-                    print('Publishing Feature Service....')
-                    csv_lyr = csv_item.publish(publish_parameters=publish_parameters, overwrite=True)
+                    log.info("Publishing feature service %s", series_title)
+                    csv_lyr = publish_item(csv_item, publish_parameters)
             else:
                 # Update the Data file for the CSV File
                 csv_item.update(item_properties=csv_item_properties, thumbnail=thumbnail, data=file)
@@ -371,17 +574,17 @@ def publish_csv(indicator, series, item_properties, thumbnail, property_update_o
                 if csv_lyr is None:
                     return None
 
-            # Move to the Open Data Folder
+            # Move to the Open Data Folder (existing CSV files added outside of it)
             if csv_item["ownerFolder"] is None:
-                print('Moving CSV to Open Data Folder')
+                log.info("Moving CSV %s to Open Data folder", series_title)
                 csv_item.move("Open Data")
 
             if csv_lyr is not None:
-                print('Updating Feature Service metadata....')
+                log.info("Updating feature service metadata for %s", series_title)
                 csv_lyr.update(item_properties=item_properties, thumbnail=thumbnail)
 
                 if csv_lyr["ownerFolder"] is None:
-                    print('Moving Feature Service to Open Data Folder')
+                    log.info("Moving feature service %s to Open Data folder", series_title)
                     csv_lyr.move("Open Data")
 
                 return csv_lyr
@@ -389,8 +592,8 @@ def publish_csv(indicator, series, item_properties, thumbnail, property_update_o
                 return None
         else:
             return None
-    except:
-        print("Unexpected error:", sys.exc_info()[0])
+    except Exception:
+        log.exception("Failed to publish the CSV file for series %s", series["code"])
         return None
 
 
@@ -400,14 +603,18 @@ def publish_csv(indicator, series, item_properties, thumbnail, property_update_o
 # In[4]:
 
 
+# Only a successful download is cached, a failure raises so the next call tries again
+@functools.lru_cache(maxsize=1)
+def load_metadata():
+    return get_cached_json(metadata_url + "/master/metadataAPI.json", "metadataAPI")
+
+
 def get_metadata():
     try:
-        metadata_req = request.Request(metadata_url + "/master/metadataAPI.json")
-        metadata_response = urlopen.urlopen(metadata_req)
-        metadata_response_bytes = metadata_response.read()
-        metadata_json_data = json.loads(metadata_response_bytes.decode("UTF-8"))
+        metadata_json_data = load_metadata()
         return metadata_json_data
-    except:
+    except Exception:
+        log.exception("Unable to load the SDG metadata")
         return None
 
 
@@ -452,11 +659,12 @@ def create_group(group_info):
             group = gis_online_connection.groups.create_from_dict(item_properties)
             display(group)
             return group
-    except:
-        traceback.print_exc()
+    except Exception:
+        log.exception("Failed to create group %s", group_info["title"])
         
 # This will delete everything. Use with caution, with a wise and clear head!!!!
 #cleanup_site()
 process_sdg_information()
 # reassign_to_admin()
-print(failed_series)
+log.info("Failed series: %s", failed_series)
+log_listener.stop()